@@ -1,20 +1,62 @@
+import os
+import time
 import requests
 import json
-import time
+
+try:
+    import orjson
+except ImportError:  # orjson이 없으면 표준 json 사용
+    orjson = None
+
+def _encode(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
 
 base_url = "http://localhost:8000"
+# 영상 녹화용 단계 사이 대기 시간(초). 기본값 0이면 대기하지 않음
+PAUSE = float(os.getenv("DEMO_PAUSE", "0"))
+
+# 요청 본문은 모두 고정값이므로 시작할 때 한 번만 직렬화해 두고 bytes 그대로 보낸다
+signup_data = {
+    "username": "john_doe",
+    "email": "john@example.com",
+    "password": "securepass123",
+    "full_name": "John Doe"
+}
+login_data = {"username": "john_doe", "password": "securepass123"}
+book_data = {
+    "title": "Python Programming",
+    "author": "John Smith",
+    "isbn": "978-0123456789",
+    "category": "Programming",
+    "total_copies": 5
+}
+# 서버 로직상: 토큰 유저 id와 user_id가 같아야 함 (첫 가입 유저가 admin=1)
+borrow_data = {"book_id": 1, "user_id": 1}
+
+SIGNUP_BODY = _encode(signup_data)
+LOGIN_BODY = _encode(login_data)
+BOOK_BODY = _encode(book_data)
+BORROW_BODY = _encode(borrow_data)
+# bytes 본문은 requests가 Content-Type을 붙이지 않으므로 직접 지정
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 def print_section(title: str):
     print("\n" + "=" * 70)
     print(title)
     print("=" * 70)
 
+def _pretty(text: str) -> str:
+    if orjson is not None:
+        return orjson.dumps(orjson.loads(text), option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(json.loads(text), ensure_ascii=False, indent=2)
+
 def print_response(label: str, resp):
     print(f"\n[{label}] status_code = {resp.status_code}")
     # JSON 우선 출력, 실패하면 text 출력
     try:
-        data = resp.json()
-        print(json.dumps(data, ensure_ascii=False, indent=2))
+        print(_pretty(resp.text or "null"))
     except Exception:
         print(resp.text)
 
@@ -23,81 +65,77 @@ def assert_ok(label: str, resp, ok_codes=(200, 201)):
         print_response(label + " (ERROR)", resp)
         raise SystemExit(f"{label} failed with status_code={resp.status_code}")
 
-# 1) 회원가입
-print_section("STEP 1) SIGNUP")
-signup_data = {
-    "username": "john_doe",
-    "email": "john@example.com",
-    "password": "securepass123",
-    "full_name": "John Doe"
-}
-response = requests.post(f"{base_url}/auth/signup", json=signup_data)
-print_response("signup", response)
+def _pause():
+    if PAUSE:
+        time.sleep(PAUSE)
 
-# 이미 가입된 유저면 400이 날 수 있으니, 영상용으로는 계속 진행 가능하게 처리
-if response.status_code not in (200, 201, 400):
-    assert_ok("signup", response)
+# 각 단계는 앞 단계 결과에 의존하므로(가입→로그인 토큰→등록→검색(대출 전 재고)→대출→대출 목록)
+# 동시에 보낼 수 있는 요청이 없다. 순서대로 보내고 하나의 keep-alive 연결을 재사용한다.
+def main():
+    # 1) 회원가입
+    print_section("STEP 1) SIGNUP")
+    response = requests.post(f"{base_url}/auth/signup", data=SIGNUP_BODY, headers=JSON_HEADERS)
+    print_response("signup", response)
 
-time.sleep(0.6)
+    # 이미 가입된 유저면 400이 날 수 있으니, 영상용으로는 계속 진행 가능하게 처리
+    if response.status_code not in (200, 201, 400):
+        assert_ok("signup", response)
 
-# 2) 로그인
-print_section("STEP 2) LOGIN")
-login_data = {"username": "john_doe", "password": "securepass123"}
-auth_response = requests.post(f"{base_url}/auth/login", json=login_data)
-print_response("login", auth_response)
-assert_ok("login", auth_response)
+    _pause()
 
-token = auth_response.json().get("access_token")
-if not token:
-    raise SystemExit("login response에 access_token이 없습니다.")
-headers = {"Authorization": f"Bearer {token}"}
-print(f"\n[token] {token[:12]}... (len={len(token)})")
+    # 2) 로그인
+    print_section("STEP 2) LOGIN")
+    auth_response = requests.post(f"{base_url}/auth/login", data=LOGIN_BODY, headers=JSON_HEADERS)
+    print_response("login", auth_response)
+    assert_ok("login", auth_response)
 
-time.sleep(0.6)
+    token = auth_response.json().get("access_token")
+    if not token:
+        raise SystemExit("login response에 access_token이 없습니다.")
+    headers = {"Authorization": f"Bearer {token}"}
+    json_headers = {**headers, **JSON_HEADERS}  # 인증이 필요한 POST용, 로그인 후 한 번만 생성
+    print(f"\n[token] {token[:12]}... (len={len(token)})")
 
-# 3) 도서 등록(관리자 권한 필요: 이 서버는 1번 유저를 admin으로 설정)
-print_section("STEP 3) CREATE BOOK")
-book_data = {
-    "title": "Python Programming",
-    "author": "John Smith",
-    "isbn": "978-0123456789",
-    "category": "Programming",
-    "total_copies": 5
-}
-create_book_resp = requests.post(f"{base_url}/books", json=book_data, headers=headers)
-print_response("create_book", create_book_resp)
+    _pause()
 
-# 이미 ISBN이 존재하면 400일 수 있으니 영상용으로 허용
-if create_book_resp.status_code not in (200, 201, 400):
-    assert_ok("create_book", create_book_resp)
+    # 3) 도서 등록(관리자 권한 필요: 이 서버는 1번 유저를 admin으로 설정)
+    print_section("STEP 3) CREATE BOOK")
+    create_book_resp = requests.post(f"{base_url}/books", data=BOOK_BODY, headers=json_headers)
+    print_response("create_book", create_book_resp)
 
-time.sleep(0.6)
+    # 이미 ISBN이 존재하면 400일 수 있으니 영상용으로 허용
+    if create_book_resp.status_code not in (200, 201, 400):
+        assert_ok("create_book", create_book_resp)
 
-# 4) 도서 검색
-print_section("STEP 4) SEARCH BOOKS")
-search_response = requests.get(f"{base_url}/books?category=Programming&available=true")
-print_response("search_books", search_response)
-assert_ok("search_books", search_response)
+    _pause()
 
-time.sleep(0.6)
+    # 4) 도서 검색 (대출 전 재고를 보여주기 위해 대출보다 먼저)
+    print_section("STEP 4) SEARCH BOOKS")
+    search_response = requests.get(f"{base_url}/books?category=Programming&available=true")
+    print_response("search_books", search_response)
+    assert_ok("search_books", search_response)
 
-# 5) 대출
-print_section("STEP 5) BORROW")
-# 서버 로직상: 토큰 유저 id와 user_id가 같아야 함 (첫 가입 유저가 admin=1)
-borrow_data = {"book_id": 1, "user_id": 1}
-borrow_resp = requests.post(f"{base_url}/loans/borrow", json=borrow_data, headers=headers)
-print_response("borrow", borrow_resp)
+    _pause()
+
+    # 5) 대출
+    print_section("STEP 5) BORROW")
+    borrow_resp = requests.post(f"{base_url}/loans/borrow", data=BORROW_BODY, headers=json_headers)
+    print_response("borrow", borrow_resp)
+
+    # 재실행 시 재고 소진/권한 등으로 400/403이 날 수 있음 -> 보여주기용으로 그대로 출력
+    if borrow_resp.status_code not in (200, 201, 400, 403, 404):
+        assert_ok("borrow", borrow_resp)
+
+    _pause()
 
-# 재실행 시 재고 소진/권한 등으로 400/403이 날 수 있음 -> 보여주기용으로 그대로 출력
-if borrow_resp.status_code not in (200, 201, 400, 403, 404):
-    assert_ok("borrow", borrow_resp)
+    # 6) 내 대출 목록 조회 (대출 결과가 반영된 뒤에 조회)
+    print_section("STEP 6) MY LOANS")
+    loans_response = requests.get(f"{base_url}/users/me/loans", headers=headers)
+    print_response("my_loans", loans_response)
+    assert_ok("my_loans", loans_response)
 
-time.sleep(0.6)
+    print_section("DONE")
 
-# 6) 내 대출 목록 조회
-print_section("STEP 6) MY LOANS")
-loans_response = requests.get(f"{base_url}/users/me/loans", headers=headers)
-print_response("my_loans", loans_response)
-assert_ok("my_loans", loans_response)
 
-print_section("DONE")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,31 @@
 from __future__ import annotations
 
 import os
+import gzip
 import hashlib
+import hmac
 import secrets
+import select
 import sys
+import threading
+import time
+import zlib
 import json as _json
-import urllib.request
-import urllib.error
+import http.client
 from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
+from urllib.parse import urlsplit
 
 from fastapi import FastAPI, Depends, HTTPException, Header, Query, status
-from pydantic import BaseModel, EmailStr, Field
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, Field
+
+try:
+    import orjson
+except ImportError:  # orjson이 없으면 표준 json으로 동작 (클라이언트 전용)
+    orjson = None
 
 
 # -----------------------------
@@ -25,37 +38,157 @@ class _SimpleResponse:
         self.headers = headers or {}
 
     def json(self) -> Any:
-        return _json.loads(self.text or "null")
+        return _json_loads(self.text or "null")
+
+
+def _json_dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        # 표준 json처럼 int 등 str이 아닌 dict 키도 허용
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return _json.dumps(obj).encode("utf-8")
+
+
+def _json_loads(text: str) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return _json.loads(text)
+
+
+# (scheme, host, port) 별로 연결을 재사용 (keep-alive)
+# HTTPConnection은 스레드 간 공유가 안 되므로 스레드마다 따로 보관
+_conn_local = threading.local()
+
+
+def _conn_cache() -> Dict[Tuple[str, str, int], http.client.HTTPConnection]:
+    cache = getattr(_conn_local, "cache", None)
+    if cache is None:
+        cache = _conn_local.cache = {}
+    return cache
 
-def _http_request(method: str, url: str, json: Any = None, headers: Any = None) -> _SimpleResponse:
-    hdrs: Dict[str, str] = {}
-    if headers is not None:
+
+def _is_dropped(conn: http.client.HTTPConnection) -> bool:
+    # 대기 중인 keep-alive 소켓이 읽기 가능하면 서버가 연결을 닫은 것(EOF)
+    if conn.sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def _get_connection(scheme: str, host: str, port: int) -> http.client.HTTPConnection:
+    cache = _conn_cache()
+    key = (scheme, host, port)
+    conn = cache.get(key)
+    if conn is not None and _is_dropped(conn):
+        conn.close()
+        conn = None
+    if conn is None:
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port)
+        else:
+            conn = http.client.HTTPConnection(host, port)
+        cache[key] = conn
+    return conn
+
+
+def _drop_connection(scheme: str, host: str, port: int) -> None:
+    conn = _conn_cache().pop((scheme, host, port), None)
+    if conn is not None:
+        conn.close()
+
+
+# 기본 헤더는 한 번만 만들어 두고, 호출자가 준 헤더에 빠진 값이 있을 때만 합친 사본을 만든다
+_BASE_HEADERS: Dict[str, str] = {"Connection": "keep-alive", "Accept-Encoding": "gzip"}
+_JSON_HEADERS: Dict[str, str] = {**_BASE_HEADERS, "Content-Type": "application/json"}
+
+
+def _merge_headers(defaults: Dict[str, str], headers: Any) -> Dict[str, str]:
+    if not headers:
+        return defaults
+    if not isinstance(headers, dict):
         try:
-            hdrs = dict(headers)
+            headers = dict(headers)
         except Exception:
-            hdrs = {}
-
-    data = None
-    if json is not None:
-        body = _json.dumps(json).encode("utf-8")
-        data = body
-        hdrs.setdefault("Content-Type", "application/json")
+            return defaults
+    # 헤더 이름은 대소문자를 구분하지 않으므로 호출자가 같은 이름을 줬으면 기본값을 넣지 않는다
+    given = {k.lower() for k in headers}
+    missing = {k: v for k, v in defaults.items() if k.lower() not in given}
+    if not missing:
+        return headers
+    return {**missing, **headers}
+
+
+def _http_request(
+    method: str, url: str, json: Any = None, headers: Any = None, data: Optional[bytes] = None
+) -> _SimpleResponse:
+    # data(미리 직렬화된 JSON bytes)가 있으면 그대로 보낸다.
+    # Content-Type은 호출자가 지정하지 않았으면 application/json
+    if data is None and json is not None:
+        data = _json_dumps(json)
+    if data is not None:
+        hdrs = _merge_headers(_JSON_HEADERS, headers)
+    else:
+        hdrs = _merge_headers(_BASE_HEADERS, headers)
+
+    parsed = urlsplit(url)
+    scheme = parsed.scheme or "http"
+    host = parsed.hostname or "localhost"
+    port = parsed.port or (443 if scheme == "https" else 80)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+
+    # 재사용한 keep-alive 연결이 서버 쪽에서 이미 닫혀 있었던 경우에만 새 연결로 한 번 재시도한다.
+    # 응답을 한 바이트라도 받은 뒤의 오류는 서버가 요청을 처리했을 수 있으므로(POST 중복 방지) 재시도하지 않는다.
+    # 전송 중 끊김은 서버가 요청 일부를 이미 받았을 수 있어 멱등한 메서드만 재시도한다.
+    method = method.upper()
+    idempotent = method in ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+    for attempt in range(2):
+        conn = _get_connection(scheme, host, port)
+        reused = conn.sock is not None
+        try:
+            try:
+                conn.request(method, path, body=data, headers=hdrs)
+            except (BrokenPipeError, ConnectionResetError):
+                if reused and idempotent and attempt == 0:
+                    _drop_connection(scheme, host, port)
+                    continue
+                raise
+            try:
+                resp = conn.getresponse()
+            except http.client.RemoteDisconnected:
+                # 상태 줄도 받지 못하고 끊김 = idle 연결이 닫혀 있었음
+                if reused and attempt == 0:
+                    _drop_connection(scheme, host, port)
+                    continue
+                raise
+            raw = resp.read()
+        except OSError as e:
+            _drop_connection(scheme, host, port)
+            raise RuntimeError(f"Failed to connect to {url}: {e}") from e
+        except http.client.HTTPException as e:
+            _drop_connection(scheme, host, port)
+            raise RuntimeError(f"Invalid HTTP response from {url}: {e!r}") from e
+        break
+
+    if resp.will_close:
+        _drop_connection(scheme, host, port)
 
-    req = urllib.request.Request(url, data=data, headers=hdrs, method=method.upper())
     try:
-        with urllib.request.urlopen(req) as resp:
-            text = resp.read().decode("utf-8")
-            return _SimpleResponse(status_code=resp.status, text=text, headers=dict(resp.headers))
-    except urllib.error.HTTPError as e:
-        text = e.read().decode("utf-8") if e.fp else ""
-        return _SimpleResponse(status_code=e.code, text=text, headers=dict(e.headers) if e.headers else {})
-    except urllib.error.URLError as e:
-        raise RuntimeError(f"Failed to connect to {url}: {e}") from e
+        if resp.getheader("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        text = raw.decode("utf-8")
+    except (OSError, EOFError, zlib.error, UnicodeDecodeError) as e:
+        raise RuntimeError(f"Failed to decode response from {url}: {e}") from e
+    return _SimpleResponse(status_code=resp.status, text=text, headers=dict(resp.getheaders()))
 
 
 # input.py에서 쓰는 API
-def post(url: str, json: Any = None, headers: Any = None) -> _SimpleResponse:
-    return _http_request("POST", url, json=json, headers=headers)
+# data: 미리 직렬화한 JSON bytes (Content-Type을 주지 않으면 application/json으로 보냄)
+def post(url: str, data: Optional[bytes] = None, json: Any = None, headers: Any = None) -> _SimpleResponse:
+    return _http_request("POST", url, json=json, headers=headers, data=data)
 
 
 def get(url: str, headers: Any = None) -> _SimpleResponse:
@@ -67,14 +200,25 @@ def get(url: str, headers: Any = None) -> _SimpleResponse:
 # -----------------------------
 HOST = os.getenv("APP_HOST", "localhost")
 PORT = int(os.getenv("APP_PORT", "8000"))
+DEV = bool(os.getenv("DEV"))
+# 저장소가 프로세스 메모리이므로 워커를 늘리면 워커마다 데이터가 따로 생긴다 (기본 1)
+WORKERS = int(os.getenv("APP_WORKERS", "1"))
+# 토큰 서명 키. 지정하지 않으면 프로세스 시작 시 무작위로 생성 (재시작하면 기존 토큰 무효)
+TOKEN_SECRET = os.getenv("APP_TOKEN_SECRET", "").encode("utf-8") or secrets.token_bytes(32)
+# 토큰 유효 시간(초)
+TOKEN_TTL = int(os.getenv("APP_TOKEN_TTL", "3600"))
 
 
 # -----------------------------
 # 데이터 모델 (Pydantic)
 # -----------------------------
+# 내부 데모용이므로 email_validator(EmailStr) 대신 간단한 형식 검사만 수행
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+
+
 class SignupRequest(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
-    email: EmailStr
+    email: str = Field(..., max_length=254, pattern=EMAIL_PATTERN)
     password: str = Field(..., min_length=6, max_length=128)
     full_name: str = Field(..., min_length=1, max_length=100)
 
@@ -82,7 +226,7 @@ class SignupRequest(BaseModel):
 class SignupResponse(BaseModel):
     id: int
     username: str
-    email: EmailStr
+    email: str
     full_name: str
     role: str
 
@@ -131,7 +275,7 @@ class LoanOut(BaseModel):
 # -----------------------------
 # 내부 저장소 (메모리 DB)
 # -----------------------------
-@dataclass
+@dataclass(slots=True)
 class UserRecord:
     id: int
     username: str
@@ -139,33 +283,101 @@ class UserRecord:
     full_name: str
     password_hash: str
     role: str  # "admin" | "user"
+    token_salt: str  # 토큰 서명용, 사용자 레코드마다 새로 생성
+
+
+@dataclass(slots=True)
+class BookRecord:
+    id: int
+    title: str
+    author: str
+    isbn: str
+    category: str
+    total_copies: int
+    available_copies: int
+
+
+# 서버가 만든 값이므로 검증 없이 응답 모델 생성
+def _book_out(book: BookRecord) -> BookOut:
+    return BookOut.model_construct(
+        id=book.id,
+        title=book.title,
+        author=book.author,
+        isbn=book.isbn,
+        category=book.category,
+        total_copies=book.total_copies,
+        available_copies=book.available_copies,
+    )
 
 
+# 평문 비밀번호가 요청 이후에도 메모리에 남지 않도록 캐시하지 않는다
+# (hashlib의 sha256은 OpenSSL 백엔드를 사용해 CPU의 SHA 가속 명령을 활용하므로 충분히 빠름)
 def _hash_password(pw: str) -> str:
     return hashlib.sha256(pw.encode("utf-8")).hexdigest()
 
 
+# 토큰 = "<user_id>.<발급 시각>.<HMAC-SHA256>" : 서버에 토큰을 저장하지 않고 서명만 검증
+# 서명에 사용자 레코드마다 새로 만드는 salt와 username을 넣어, 재시작 후나 다른 워커에서
+# 같은 id를 받은 다른 사용자에게는 토큰이 통하지 않게 한다
+def _token_mac(user: UserRecord, issued_at: str) -> str:
+    msg = f"{user.id}.{issued_at}.{user.token_salt}.{user.username}"
+    return hmac.new(TOKEN_SECRET, msg.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _issue_token(user: UserRecord) -> str:
+    issued_at = str(int(time.time()))
+    return f"{user.id}.{issued_at}.{_token_mac(user, issued_at)}"
+
+
+def _parse_token(authorization: str) -> Optional[Tuple[int, str, str]]:
+    parts = authorization.split(" ", 1)[1].strip().split(".")
+    if len(parts) != 3:
+        return None
+    uid, issued_at, mac = parts
+    # 비ASCII 문자가 섞이면 compare_digest가 TypeError를 내므로 먼저 거른다 ("²".isdigit()도 True)
+    if not (uid.isascii() and uid.isdigit() and issued_at.isascii() and issued_at.isdigit() and mac.isascii()):
+        return None
+    return int(uid), issued_at, mac
+
+
 def create_fastapi_app() -> FastAPI:
     app = FastAPI(title="Online Library API", version="0.1.0")
+    # 도서 목록처럼 큰 응답(1KB 이상)만 gzip 압축
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
 
     users_by_id: Dict[int, UserRecord] = {}
     user_id_by_username: Dict[str, int] = {}
-    tokens_to_user_id: Dict[str, int] = {}
+    next_user_id = 1
 
-    books_by_id: Dict[int, BookOut] = {}
+    books_by_id: Dict[int, BookRecord] = {}
+    book_id_by_isbn: Dict[str, int] = {}
+    # 카테고리별 도서 id (등록 순서 유지)
+    book_ids_by_category: Dict[str, List[int]] = {}
     next_book_id = 1
 
-    loans: List[LoanOut] = []
+    loans_by_user_id: Dict[int, List[LoanOut]] = {}
     next_loan_id = 1
 
+    # 검증 결과는 토큰과 이 앱의 사용자 레코드로만 정해지므로 Authorization 헤더 값 단위로 캐시
+    # (만료는 캐시 밖에서 매번 확인. 사용자 삭제/토큰 폐기를 추가하면 cache_clear() 필요)
+    @lru_cache(maxsize=4096)
+    def resolve_token(authorization: str) -> Optional[Tuple[int, int]]:
+        parsed = _parse_token(authorization)
+        if parsed is None:
+            return None
+        uid, issued_at, mac = parsed
+        user = users_by_id.get(uid)
+        if user is None or not hmac.compare_digest(mac, _token_mac(user, issued_at)):
+            return None
+        return uid, int(issued_at)
+
     def get_current_user(authorization: str = Header(...)) -> UserRecord:
         if not authorization.lower().startswith("bearer "):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Authorization header")
-        token = authorization.split(" ", 1)[1].strip()
-        user_id = tokens_to_user_id.get(token)
-        if not user_id or user_id not in users_by_id:
+        resolved = resolve_token(authorization)
+        if resolved is None or time.time() - resolved[1] > TOKEN_TTL:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
-        return users_by_id[user_id]
+        return users_by_id[resolved[0]]
 
     def require_admin(user: UserRecord = Depends(get_current_user)) -> UserRecord:
         if user.role != "admin":
@@ -174,24 +386,28 @@ def create_fastapi_app() -> FastAPI:
 
     @app.post("/auth/signup", response_model=SignupResponse)
     async def signup(payload: SignupRequest):
+        nonlocal next_user_id
+
         if payload.username in user_id_by_username:
             raise HTTPException(status_code=400, detail="Username already exists")
 
-        new_id = (max(users_by_id.keys()) + 1) if users_by_id else 1
+        new_id = next_user_id
+        next_user_id += 1
         role = "admin" if new_id == 1 else "user"
 
         user = UserRecord(
             id=new_id,
             username=payload.username,
-            email=str(payload.email),
+            email=payload.email,
             full_name=payload.full_name,
             password_hash=_hash_password(payload.password),
             role=role,
+            token_salt=secrets.token_hex(16),
         )
         users_by_id[user.id] = user
         user_id_by_username[user.username] = user.id
 
-        return SignupResponse(id=user.id, username=user.username, email=user.email, full_name=user.full_name, role=user.role)
+        return SignupResponse.model_construct(id=user.id, username=user.username, email=user.email, full_name=user.full_name, role=user.role)
 
     @app.post("/auth/login", response_model=TokenResponse)
     async def login(payload: LoginRequest):
@@ -203,19 +419,17 @@ def create_fastapi_app() -> FastAPI:
         if user.password_hash != _hash_password(payload.password):
             raise HTTPException(status_code=401, detail="Invalid credentials")
 
-        token = secrets.token_urlsafe(32)
-        tokens_to_user_id[token] = user.id
-        return TokenResponse(access_token=token)
+        token = _issue_token(user)
+        return TokenResponse.model_construct(access_token=token)
 
     @app.post("/books", response_model=BookOut)
     async def create_book(payload: BookCreateRequest, admin: UserRecord = Depends(require_admin)):
         nonlocal next_book_id
 
-        for b in books_by_id.values():
-            if b.isbn == payload.isbn:
-                raise HTTPException(status_code=400, detail="ISBN already exists")
+        if payload.isbn in book_id_by_isbn:
+            raise HTTPException(status_code=400, detail="ISBN already exists")
 
-        book = BookOut(
+        book = BookRecord(
             id=next_book_id,
             title=payload.title,
             author=payload.author,
@@ -225,17 +439,24 @@ def create_fastapi_app() -> FastAPI:
             available_copies=payload.total_copies,
         )
         books_by_id[book.id] = book
+        book_id_by_isbn[book.isbn] = book.id
+        book_ids_by_category.setdefault(book.category, []).append(book.id)
         next_book_id += 1
-        return book
+        return _book_out(book)
 
     @app.get("/books", response_model=List[BookOut])
     async def search_books(category: Optional[str] = Query(None), available: Optional[bool] = Query(None)):
-        results = list(books_by_id.values())
-        if category is not None:
-            results = [b for b in results if b.category == category]
-        if available is not None:
-            results = [b for b in results if (b.available_copies > 0) == available]
-        return results
+        # 결과는 항상 등록 순서대로, 대상 도서를 한 번만 순회하며 바로 응답 리스트를 만든다
+        if category is None:
+            if available is None:
+                return [_book_out(b) for b in books_by_id.values()]
+            return [_book_out(b) for b in books_by_id.values() if (b.available_copies > 0) == available]
+
+        ids = book_ids_by_category.get(category, [])
+        if available is None:
+            return [_book_out(books_by_id[i]) for i in ids]
+        books = (books_by_id[i] for i in ids)
+        return [_book_out(b) for b in books if (b.available_copies > 0) == available]
 
     @app.post("/loans/borrow", response_model=LoanOut)
     async def borrow_book(payload: BorrowRequest, user: UserRecord = Depends(get_current_user)):
@@ -250,22 +471,23 @@ def create_fastapi_app() -> FastAPI:
         if book.available_copies <= 0:
             raise HTTPException(status_code=400, detail="No available copies")
 
-        books_by_id[payload.book_id] = book.model_copy(update={"available_copies": book.available_copies - 1})
+        # 내부 레코드는 그대로 수정 (응답 모델을 새로 만들지 않음)
+        book.available_copies -= 1
 
-        loan = LoanOut(
+        loan = LoanOut.model_construct(
             id=next_loan_id,
             user_id=user.id,
             book_id=payload.book_id,
             borrowed_at=datetime.now(timezone.utc),
             returned_at=None,
         )
-        loans.append(loan)
+        loans_by_user_id.setdefault(user.id, []).append(loan)
         next_loan_id += 1
         return loan
 
     @app.get("/users/me/loans", response_model=List[LoanOut])
     async def my_loans(user: UserRecord = Depends(get_current_user)):
-        return [l for l in loans if l.user_id == user.id]
+        return loans_by_user_id.get(user.id, [])
 
     return app
 
@@ -275,5 +497,19 @@ __all__ = ["fastapi_app"]
 
 if __name__ == "__main__":
     import uvicorn
-    # 직접 실행 시에는 import string 말고 app 객체를 넘기는 게 안전
-    uvicorn.run(fastapi_app, host=HOST, port=PORT, reload=True)
\ No newline at end of file
+    # loop/http는 "auto": uvloop, httptools가 설치되어 있으면 사용하고 없으면 asyncio/h11로 동작
+    # (uvloop은 Windows 미지원이라 강제하지 않음)
+    if DEV or WORKERS > 1:
+        # reload/workers는 import string이 필요
+        uvicorn.run(
+            "requests:fastapi_app",
+            host=HOST,
+            port=PORT,
+            reload=DEV,
+            workers=None if DEV else WORKERS,
+            loop="auto",
+            http="auto",
+        )
+    else:
+        # 직접 실행 시에는 import string 말고 app 객체를 넘기는 게 안전
+        uvicorn.run(fastapi_app, host=HOST, port=PORT, loop="auto", http="auto")